@@ -20,9 +20,12 @@ class DeviceManager:
             logger.error(f"Failed to create storage directory: {e}")
         
         self.devices = {}
+        # Wird bei jeder Änderung erhöht, damit die Web-UI ihre Geräteliste cachen kann
+        self.version = 0
         self.load_devices()
 
     def load_devices(self):
+        self.version += 1
         if os.path.exists(self.storage_file):
             try:
                 with open(self.storage_file, 'r') as f:
@@ -45,13 +48,16 @@ class DeviceManager:
     def list_devices(self):
         return list(self.devices.values())
 
+    def count(self):
+        return len(self.devices)
+
     def get_device(self, device_id):
         return self.devices.get(device_id)
 
-    def add_device(self, device_id, name, eep, manufacturer='Unknown', provisioning_data=None):
+    def _put_device(self, device_id, name, eep, manufacturer='Unknown', provisioning_data=None):
         # Wenn Gerät existiert und EEP gleich ist, nichts tun
         if device_id in self.devices and self.devices[device_id].get('eep') == eep:
-            return False
+            return None
         
         device = {
             'id': device_id,
@@ -65,28 +71,53 @@ class DeviceManager:
             device['provisioning_options'] = provisioning_data
             
         self.devices[device_id] = device
-        self.save_devices()
+        self.version += 1
         logger.info(f"Added/Updated device: {device_id} ({name})")
+        return device
+
+    def add_device(self, device_id, name, eep, manufacturer='Unknown', provisioning_data=None):
+        if not self._put_device(device_id, name, eep, manufacturer, provisioning_data):
+            return False
+        self.save_devices()
         return True
 
-    def update_device(self, device_id, data):
-        if device_id in self.devices:
-            self.devices[device_id].update(data)
+    def add_devices(self, entries):
+        """Adds several devices with a single disk write, returns the created devices"""
+        created = []
+        for entry in entries:
+            device = self._put_device(entry.get('id'), entry.get('name'), entry.get('eep'),
+                                      entry.get('manufacturer', 'Unknown'))
+            if device: created.append(device)
+        if created:
             self.save_devices()
-            logger.info(f"Updated device {device_id}")
-            return True
-        return False
-        
-    def remove_device(self, device_id):
-        if device_id in self.devices:
-            del self.devices[device_id]
+        return created
+
+    def update_device(self, device_id, data):
+        """Updates a device and returns it, or None if it does not exist"""
+        device = self.devices.get(device_id)
+        if device is None:
+            return None
+        device.update(data)
+        self.version += 1
+        self.save_devices()
+        logger.info(f"Updated device {device_id}")
+        return device
+
+    def pop_device(self, device_id):
+        """Removes a device and returns it, or None if it does not exist"""
+        device = self.devices.pop(device_id, None)
+        if device is not None:
+            self.version += 1
             self.save_devices()
             logger.info(f"Removed device {device_id}")
-            return True
-        return False
+        return device
+
+    def remove_device(self, device_id):
+        return self.pop_device(device_id) is not None
 
     def update_last_seen(self, device_id, rssi):
         if device_id in self.devices:
             self.devices[device_id]['rssi'] = rssi
             self.devices[device_id]['last_seen'] = datetime.now().isoformat()
+            self.version += 1
             # Wir speichern hier NICHT jedes Mal auf Disk (I/O Reduktion)
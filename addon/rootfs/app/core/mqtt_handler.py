@@ -111,13 +111,24 @@ class MQTTHandler:
         payload = "online" if available else "offline"
         self.client.publish(topic, payload, qos=1, retain=True)
 
+    def publish_batch(self, messages):
+        """Queues (topic, payload, qos, retain) tuples back-to-back for the network loop thread"""
+        for topic, payload, qos, retain in messages:
+            self.client.publish(topic, payload, qos=qos, retain=retain)
+
+    def clear_retained(self, topics, qos=0):
+        """Clears retained messages. QoS 0 only where a fresh publish follows; use qos=1 when nothing republishes"""
+        self.publish_batch([(topic, "", qos, True) for topic in topics])
+
     def remove_device(self, device_id, entities):
+        # State/Availability auch ohne Verbindung löschen: Paho hält QoS>0 Nachrichten und sendet sie nach dem Reconnect
+        # QoS 1: für ein gelöschtes Gerät publiziert niemand mehr, ein verlorenes Clear bliebe für immer stehen
+        self.clear_retained([f"enocean/{device_id}/state", f"enocean/{device_id}/availability"], qos=1)
         if not self.connected: return
-        self.client.publish(f"enocean/{device_id}/state", "", qos=1, retain=True)
-        self.client.publish(f"enocean/{device_id}/availability", "", qos=1, retain=True)
+        messages = []
         for entity in entities:
             key = entity.get('key', 'main')
             component = entity.get('component', 'sensor')
             unique_id = f"{device_id}_{key}"
-            discovery_topic = f"homeassistant/{component}/{unique_id}/config"
-            self.client.publish(discovery_topic, "", qos=1, retain=True)
+            messages.append((f"homeassistant/{component}/{unique_id}/config", "", 1, True))
+        self.publish_batch(messages)
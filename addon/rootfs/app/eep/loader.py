@@ -35,11 +35,16 @@ class EEPLoader:
             self.base_paths = base_paths
             
         self.profiles = {}
+        self._profile_list = ()
+        # Wird bei jedem (Neu-)Laden erhöht, damit die Web-UI ihre Profilliste cachen kann
+        self.version = 0
         self.load_profiles()
 
     def load_profiles(self):
         """Loads or reloads all JSON profiles from all configured base paths"""
-        self.profiles = {}
+        # In ein neues Dict laden und erst am Ende tauschen: der Reload läuft
+        # ggf. in einem Worker-Thread, Leser sehen nie eine halb gefüllte Map
+        profiles = {}
         count = 0
         
         # Durchlaufe alle Pfade (z.B. erst /app/eep..., dann /data/eep...)
@@ -57,18 +62,21 @@ class EEPLoader:
                     with open(file_path, 'r', encoding='utf-8') as f:
                         data = json.load(f)
                         if 'eep' in data:
-                            self.profiles[data['eep']] = EEPProfile(data)
+                            profiles[data['eep']] = EEPProfile(data)
                             count += 1
                 except Exception as e:
                     logger.error(f"Error loading EEP from {file_path}: {e}")
         
+        self.profiles = profiles
+        # Profile-Liste einmal pro Ladevorgang bauen statt bei jedem API-Aufruf
+        self._profile_list = tuple(
+            {'eep': p.eep, 'title': p.title, 'rorg': p.rorg} for p in profiles.values()
+        )
+        self.version += 1
         logger.info(f"Loaded total {len(self.profiles)} unique EEP profiles")
 
     def get_profile(self, eep_name):
         return self.profiles.get(eep_name)
 
     def list_profiles(self):
-        result = []
-        for p in self.profiles.values():
-            result.append({'eep': p.eep, 'title': p.title, 'rorg': p.rorg})
-        return result
+        return self._profile_list
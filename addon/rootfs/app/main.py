@@ -7,7 +7,9 @@ import os
 import sys
 import signal
 import json
-from datetime import datetime, timedelta
+import threading
+import aiohttp
+from datetime import datetime, timedelta, timezone
 
 # Determine base path dynamically
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
@@ -30,6 +32,11 @@ from service_state import service_state
 import uvicorn
 from web_ui.app import app as web_app
 
+try:
+    import uvloop # Kommt mit uvicorn[standard], fehlt aber evtl. auf exotischen Plattformen
+except ImportError:
+    uvloop = None
+
 # Configure logging
 log_level = os.getenv('LOG_LEVEL', 'INFO').upper()
 logging.basicConfig(
@@ -51,6 +58,11 @@ class EnOceanMQTTService:
         self.command_tracker = None
         self.running = False
         self.discovery_end_time = None
+        self._profile_downloads = {} # (url, filename_hint) -> laufender Download-Task
+        self._http_session = None
+        # Schreiben + Reload serialisieren: parallele Reloads in Worker-Threads würden sich sonst
+        # gegenseitig überschreiben (der zuletzt fertige Scan gewinnt, auch wenn er älter ist)
+        self._profile_store_lock = threading.Lock()
         
         # Config
         self.addon_version = os.getenv('ADDON_VERSION', 'dev')
@@ -87,51 +99,73 @@ class EnOceanMQTTService:
         return int((self.discovery_end_time - datetime.now()).total_seconds())
 
     # --- Provisioning Logic ---
+    def _get_http_session(self):
+        """Shared aiohttp session, keeps connections to the provisioning server alive"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=10, keepalive_timeout=30)
+            )
+        return self._http_session
+
     async def _download_and_save_profile(self, url, filename_hint):
         """
         Downloads JSON profile, saves it to PERSISTENT storage, and RETURNS THE INTERNAL EEP NAME.
+        Concurrent calls for the same profile share one download.
         """
-        import aiohttp
+        key = (url, filename_hint)
+        task = self._profile_downloads.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch_profile(url, filename_hint))
+            self._profile_downloads[key] = task
+            task.add_done_callback(lambda _: self._profile_downloads.pop(key, None))
+        # shield: ein abgebrochener Request bricht den Download der anderen nicht ab
+        return await asyncio.shield(task)
+
+    async def _fetch_profile(self, url, filename_hint):
         try:
             logger.info(f"Downloading profile from {url}...")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=5) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        real_eep_name = data.get('eep')
-                        if not real_eep_name:
-                            logger.error("Downloaded JSON has no 'eep' field!")
-                            return None
-
-                        # FIX: Save to /data/eep
-                        path = os.path.join(DATA_PATH, 'eep')
-                        os.makedirs(path, exist_ok=True)
-                        
-                        filename = f"{filename_hint}.json"
-                        with open(os.path.join(path, filename), 'w') as f:
-                            json.dump(data, f, indent=2)
-                        
-                        self.eep_loader.load_profiles() 
-                        logger.info(f"✅ Profile loaded to persistent storage. Internal Name: {real_eep_name}")
-                        return real_eep_name
-                    else:
-                        logger.error(f"Download failed with status {response.status}")
+            session = self._get_http_session()
+            async with session.get(url, timeout=5) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    real_eep_name = data.get('eep')
+                    if not real_eep_name:
+                        logger.error("Downloaded JSON has no 'eep' field!")
+                        return None
+
+                    # Datei schreiben + alle Profile neu laden blockiert -> Worker-Thread
+                    await asyncio.to_thread(self._store_profile, data, filename_hint)
+                    logger.info(f"✅ Profile loaded to persistent storage. Internal Name: {real_eep_name}")
+                    return real_eep_name
+                else:
+                    logger.error(f"Download failed with status {response.status}")
         except Exception as e:
             logger.error(f"Download failed: {e}")
         return None
 
+    def _store_profile(self, data, filename_hint):
+        # FIX: Save to /data/eep
+        path = os.path.join(DATA_PATH, 'eep')
+        os.makedirs(path, exist_ok=True)
+        
+        filename = f"{filename_hint}.json"
+        with self._profile_store_lock:
+            with open(os.path.join(path, filename), 'w') as f:
+                json.dump(data, f, indent=2)
+            
+            self.eep_loader.load_profiles()
+
     async def check_cloud_provisioning(self, device_id):
         if not self.provisioning_url: return None
-        import aiohttp
         try:
             url = f"{self.provisioning_url.rstrip('/')}/{device_id}.json"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, timeout=2) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        logger.info("✨ Provisioning data found!")
-                        return data
+            session = self._get_http_session()
+            async with session.get(url, timeout=2) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    logger.info("✨ Provisioning data found!")
+                    return data
         except Exception as e:
             pass
         return None
@@ -173,7 +207,7 @@ class EnOceanMQTTService:
 
         # 3. Core (FIX: DeviceManager on persistent storage)
         self.device_manager = DeviceManager(os.path.join(DATA_PATH, 'devices.json'))
-        service_state.update_status('devices', len(self.device_manager.list_devices()))
+        service_state.update_status('devices', self.device_manager.count())
         
         self.state_persistence = StatePersistence() # StatePersistence nutzt intern meist eh schon default paths, aber ist hier ok.
         self.command_translator = CommandTranslator(self.eep_loader)
@@ -209,8 +243,7 @@ class EnOceanMQTTService:
             is_controllable = self.command_translator.is_controllable(device['eep'])
             
             if self.mqtt_handler and self.mqtt_handler.connected:
-                self.mqtt_handler.client.publish(f"enocean/{device['id']}/state", "", qos=1, retain=True)
-                self.mqtt_handler.client.publish(f"enocean/{device['id']}/availability", "", qos=1, retain=True)
+                self.mqtt_handler.clear_retained([f"enocean/{device['id']}/state", f"enocean/{device['id']}/availability"])
                 await asyncio.sleep(0.1)
                 
                 entities = profile.get_entities()
@@ -274,7 +307,7 @@ class EnOceanMQTTService:
             if not device: return 
             device['rorg'] = hex(rorg)
             self.device_manager.update_last_seen(sender_id, rssi) 
-            service_state.update_status('devices', len(self.device_manager.list_devices()))
+            service_state.update_status('devices', self.device_manager.count())
 
             if not device.get('enabled'): return
             if not service_state.get_status().get('gateway_connected'):
@@ -291,7 +324,6 @@ class EnOceanMQTTService:
             parsed_data = self.eep_parser.parse_telegram_with_full_data(packet.data, profile)
 
             if parsed_data:
-                from datetime import datetime, timezone
                 parsed_data['rssi'] = rssi
                 parsed_data['last_seen'] = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
                 
@@ -304,7 +336,7 @@ class EnOceanMQTTService:
                     if not device.get('discovery_published', False):
                         await self.publish_device_discovery(device)
                         device['discovery_published'] = True
-                        self.device_manager.devices[sender_id] = device
+                        self.device_manager.version += 1
                     self.mqtt_handler.publish_state(sender_id, parsed_data, retain=True)
                     self.mqtt_handler.publish_availability(sender_id, True)
                 else:
@@ -410,11 +442,14 @@ class EnOceanMQTTService:
         if self.serial_handler: 
             self.serial_handler.stop_reading()
             self.serial_handler.close()
+        if self._http_session and not self._http_session.closed:
+            await self._http_session.close()
 
 async def main():
     service = EnOceanMQTTService()
     await service.run()
 
 if __name__ == "__main__":
+    if uvloop: uvloop.install()
     try: asyncio.run(main())
     except: pass
@@ -3,27 +3,140 @@ Web UI Application (Starlette) - FIX Connection Type Logic
 """
 import os
 import json
+import asyncio
+import hashlib
 import logging
+import functools
+import time
 from starlette.applications import Starlette
-from starlette.responses import JSONResponse, HTMLResponse
-from starlette.routing import Route
+from starlette.responses import JSONResponse, HTMLResponse, Response
+from starlette.routing import Route, Mount
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from service_state import service_state
 
+try:
+    import orjson
+except ImportError: # Nicht für jede Add-on-Architektur als Wheel verfügbar
+    orjson = None
+
 logger = logging.getLogger(__name__)
 BASE_PATH = os.path.dirname(os.path.abspath(__file__))
 TEMPLATES_PATH = os.path.join(BASE_PATH, 'templates')
+DASHBOARD_PATH = os.path.join(TEMPLATES_PATH, 'dashboard_new.html')
 
-async def homepage(request):
+# Konstante Antworten werden einmal gebaut und wiederverwendet.
+# Alle Bodies bleiben unter der GZip-Schwelle, die Middleware ändert ihre Header also nie.
+def _const_response(body, status_code=200):
+    return Response(body, status_code=status_code, media_type='application/json')
+
+_HEALTH = _const_response(b'{"status":"ok"}')
+_R503_NOT_READY = _const_response(b'{"error":"Service not ready"}', 503)
+_R404_NOT_FOUND = _const_response(b'{"detail":"Not found"}', 404)
+_R400_EXISTS = _const_response(b'{"detail":"Exists"}', 400)
+_R400_FAILED = _const_response(b'{"detail":"Failed"}', 400)
+_R400_NOT_A_LIST = _const_response(b'{"detail":"Expected a list of devices"}', 400)
+_R400_MISSING_ID = _const_response(b'{"detail":"Every device needs a non-empty string id"}', 400)
+_R400_DELETE_FAILED = _const_response(b'{"detail":"Delete failed or device not found"}', 400)
+_R502_DOWNLOAD_FAILED = _const_response(b'{"detail":"Profile download failed"}', 502)
+_OK_STARTED = _const_response(b'{"status":"started"}')
+_OK_STOPPED = _const_response(b'{"status":"stopped"}')
+_OK_CREATED = _const_response(b'{"status":"created"}')
+_OK_UPDATED = _const_response(b'{"status":"updated"}')
+_OK_DELETED = _const_response(b'{"status":"deleted"}')
+
+STATUS_TTL = 1.0 # Sekunden, Dashboards pollen /api/status im Sekundentakt
+_status_cache = None # (expires, body, etag)
+
+def _dumps(data):
+    if orjson: return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content):
+        return _dumps(content)
+
+async def _read_json(request):
+    body = await request.body()
+    if orjson: return orjson.loads(body)
+    return json.loads(body)
+
+def _encode(data):
+    """Returns the encoded JSON body and its ETag"""
+    body = _dumps(data)
+    return body, f'"{hashlib.blake2s(body, digest_size=8).hexdigest()}"'
+
+def _etag_response(request, body, etag):
+    """JSON response with ETag, 304 if the client already has this payload"""
+    if request.headers.get('if-none-match') == etag:
+        return Response(status_code=304, headers={'ETag': etag})
+    return Response(body, media_type='application/json', headers={'ETag': etag})
+
+def _json_etag_response(request, data):
+    return _etag_response(request, *_encode(data))
+
+class _VersionedBody:
+    """Encoded JSON body + ETag, rebuilt only when the owner's version counter changes"""
+    def __init__(self):
+        self.owner = None
+        self.version = None
+        self.body = None
+        self.etag = None
+
+    def get(self, owner, build):
+        version = owner.version
+        if owner is not self.owner or version != self.version:
+            # Version vor build() lesen: ein Reload im Worker-Thread dazwischen
+            # führt so höchstens zu einem erneuten Build, nie zu einem veralteten Cache
+            self.body, self.etag = _encode(build())
+            self.owner, self.version = owner, version
+        return self.body, self.etag
+
+_devices_body = _VersionedBody()
+_profiles_body = _VersionedBody()
+
+def _requires_device_manager(endpoint):
+    """Resolves the device manager once per request and answers 503 while the service starts"""
+    @functools.wraps(endpoint)
+    async def wrapper(request):
+        manager = service_state.get_device_manager()
+        if not manager: return _R503_NOT_READY
+        return await endpoint(request, manager)
+    return wrapper
+
+# Dashboard ist statisch -> einmal beim Import laden statt bei jedem Aufruf
+_DASHBOARD_HTML = None
+_DASHBOARD_ETAG = None
+_DASHBOARD_ERROR = None
+
+def load_dashboard():
+    global _DASHBOARD_HTML, _DASHBOARD_ETAG, _DASHBOARD_ERROR
     try:
-        with open(os.path.join(TEMPLATES_PATH, 'dashboard_new.html'), 'r', encoding='utf-8') as f:
-            content = f.read()
-        return HTMLResponse(content)
+        with open(DASHBOARD_PATH, 'rb') as f:
+            _DASHBOARD_HTML = f.read()
+        _DASHBOARD_ETAG = f'"{hashlib.sha1(_DASHBOARD_HTML).hexdigest()}"'
     except Exception as e:
-        return HTMLResponse(f"Error loading dashboard: {e}", status_code=500)
+        _DASHBOARD_ERROR = e
+        logger.error(f"Error loading dashboard: {e}")
+    return _DASHBOARD_HTML
 
-async def api_status(request):
+load_dashboard()
+
+async def homepage(request):
+    # Fallback: erneut von Disk lesen, falls das Vorladen fehlgeschlagen ist
+    content = _DASHBOARD_HTML or load_dashboard()
+    if content is None:
+        return HTMLResponse(f"Error loading dashboard: {_DASHBOARD_ERROR}", status_code=500)
+    if request.headers.get('if-none-match') == _DASHBOARD_ETAG:
+        return Response(status_code=304, headers={'ETag': _DASHBOARD_ETAG})
+    return Response(content, media_type='text/html',
+                    headers={'ETag': _DASHBOARD_ETAG, 'Cache-Control': 'public, max-age=60'})
+
+async def health(request):
+    return _HEALTH
+
+def _build_status():
     status = service_state.get_status()
     service = service_state.get_service()
     if service:
@@ -84,52 +197,97 @@ async def api_status(request):
         status['discovery_remaining'] = 0
         status['mqtt_info'] = {}
         status['gateway_info'] = {}
+    return status
 
-    return JSONResponse(status)
+def _invalidate_status():
+    global _status_cache
+    _status_cache = None
+
+def _update_device_count(manager):
+    service_state.update_status('devices', manager.count())
+    _invalidate_status()
+
+async def api_status(request):
+    global _status_cache
+    now = time.monotonic()
+    if _status_cache is None or now >= _status_cache[0]:
+        _status_cache = (now + STATUS_TTL, *_encode(_build_status()))
+    return _etag_response(request, _status_cache[1], _status_cache[2])
 
 async def api_discovery_control(request):
     service = service_state.get_service()
-    if not service: return JSONResponse({'error': 'Service not ready'}, status_code=503)
+    if not service: return _R503_NOT_READY
     if request.method == 'POST':
         try:
-            data = await request.json()
+            data = await _read_json(request)
             action = data.get('action')
+            _invalidate_status() # Dashboard soll den Wechsel sofort sehen
             if action == 'start':
                 service.start_discovery(int(data.get('duration', 60)))
-                return JSONResponse({'status': 'started'})
+                return _OK_STARTED
             elif action == 'stop':
                 service.stop_discovery()
-                return JSONResponse({'status': 'stopped'})
-        except Exception as e: return JSONResponse({'error': str(e)}, status_code=400)
+                return _OK_STOPPED
+        except Exception as e: return ORJSONResponse({'error': str(e)}, status_code=400)
 
-async def api_devices(request):
-    manager = service_state.get_device_manager()
-    if not manager: return JSONResponse({'error': 'Service not ready'}, status_code=503)
+@_requires_device_manager
+async def api_devices(request, manager):
     if request.method == 'GET':
-        return JSONResponse({'devices': manager.list_devices()})
+        body, etag = _devices_body.get(manager, lambda: {'devices': manager.list_devices()})
+        return _etag_response(request, body, etag)
     elif request.method == 'POST':
         try:
-            data = await request.json()
+            data = await _read_json(request)
             success = manager.add_device(data.get('id'), data.get('name'), data.get('eep'))
             if success:
-                service_state.update_status('devices', len(manager.list_devices()))
-                return JSONResponse({'status': 'created'})
-            return JSONResponse({'detail': 'Exists'}, status_code=400)
-        except Exception as e: return JSONResponse({'detail': str(e)}, status_code=400)
+                _update_device_count(manager)
+                return _OK_CREATED
+            return _R400_EXISTS
+        except Exception as e: return ORJSONResponse({'detail': str(e)}, status_code=400)
+
+@_requires_device_manager
+async def api_devices_batch(request, manager):
+    try:
+        data = await _read_json(request)
+        if not isinstance(data, list):
+            return _R400_NOT_A_LIST
+        # Jeder Eintrag braucht eine eindeutige, nicht-leere String-ID
+        # (sonst landet ein Gerät unter None/"null" und lässt sich nicht mehr löschen)
+        if not all(isinstance(d, dict) and isinstance(d.get('id'), str) and d['id'] for d in data):
+            return _R400_MISSING_ID
+        ids = [d['id'] for d in data]
+        if len(set(ids)) != len(ids):
+            duplicates = sorted({i for i in ids if ids.count(i) > 1})
+            return ORJSONResponse({'detail': 'Duplicate device ids', 'ids': duplicates}, status_code=400)
+        loader = service_state.get_eep_loader()
+        if loader:
+            unknown = [d.get('eep') for d in data if d.get('eep') != 'pending' and d.get('eep') not in loader.profiles]
+            if unknown: return ORJSONResponse({'detail': 'Unknown EEP profiles', 'eeps': unknown}, status_code=400)
+        created = manager.add_devices(data)
+    except Exception as e: return ORJSONResponse({'detail': str(e)}, status_code=400)
+
+    _update_device_count(manager)
+    service = service_state.get_service()
+    if service and created:
+        await asyncio.gather(*[service.publish_device_discovery(d) for d in created if d.get('eep') != 'pending'])
+    return ORJSONResponse({'status': 'created', 'created': [d['id'] for d in created]})
 
-async def api_device_detail(request):
+@_requires_device_manager
+async def api_device_detail(request, manager):
     device_id = request.path_params['device_id']
-    manager = service_state.get_device_manager()
-    if not manager: return JSONResponse({'error': 'Service not ready'}, status_code=503)
+    # Handles einmal pro Request auflösen statt mehrfach über service_state
+    service = service_state.get_service()
+    loader = service.eep_loader if service else None
+    mqtt = service.mqtt_handler if service else None
     
     if request.method == 'GET':
         device = manager.get_device(device_id)
-        if device: return JSONResponse(device)
-        return JSONResponse({'detail': 'Not found'}, status_code=404)
+        if device: return ORJSONResponse(device)
+        return _R404_NOT_FOUND
     
     elif request.method == 'PUT':
-        data = await request.json()
-        service = service_state.get_service()
+        try: data = await _read_json(request)
+        except ValueError as e: return ORJSONResponse({'detail': str(e)}, status_code=400)
         if 'provisioning_variant_url' in data and service:
             url = data['provisioning_variant_url']
             vid = data['provisioning_variant_id']
@@ -140,63 +298,71 @@ async def api_device_detail(request):
                 del data['provisioning_variant_url']
                 del data['provisioning_variant_id']
             else:
-                return JSONResponse({'detail': 'Profile download failed'}, status_code=502)
+                return _R502_DOWNLOAD_FAILED
 
         old_device = manager.get_device(device_id)
         old_eep = old_device.get('eep') if old_device else None
         
-        if manager.update_device(device_id, data):
+        new_device = manager.update_device(device_id, data)
+        if new_device:
             if service:
-                new_device = manager.get_device(device_id)
                 new_eep = new_device.get('eep')
                 if old_eep and old_eep != 'pending' and old_eep != new_eep:
-                    loader = service_state.get_eep_loader()
-                    mqtt = service_state.get_mqtt_handler()
                     if loader and mqtt:
                         prof = loader.get_profile(old_eep)
                         if prof: mqtt.remove_device(device_id, prof.get_entities())
                 if new_device.get('enabled') and new_eep != 'pending':
                     await service.publish_device_discovery(new_device)
-            return JSONResponse({'status': 'updated'})
-        return JSONResponse({'detail': 'Failed'}, status_code=400)
+            return _OK_UPDATED
+        return _R400_FAILED
     
     elif request.method == 'DELETE':
-        device = manager.get_device(device_id)
+        device = manager.pop_device(device_id)
         if device:
-            mqtt = service_state.get_mqtt_handler()
-            loader = service_state.get_eep_loader()
-            if mqtt and loader and device.get('eep') != 'pending':
-                try:
-                    profile = loader.get_profile(device['eep'])
-                    if profile:
-                        entities = profile.get_entities()
-                        mqtt.remove_device(device_id, entities)
-                except Exception as e:
-                    logger.error(f"Error removing HA entities during delete: {e}")
-
-            if manager.remove_device(device_id):
-                service_state.update_status('devices', len(manager.list_devices()))
-                if mqtt:
-                    mqtt.client.publish(f"enocean/{device_id}/state", "", qos=1, retain=True)
-                    mqtt.client.publish(f"enocean/{device_id}/availability", "", qos=1, retain=True)
-                return JSONResponse({'status': 'deleted'})
-        return JSONResponse({'detail': 'Delete failed or device not found'}, status_code=400)
+            _update_device_count(manager)
+            if mqtt:
+                # State/Availability und Discovery-Configs gemeinsam in einem Batch leeren
+                entities = []
+                if loader and device.get('eep') != 'pending':
+                    try:
+                        profile = loader.get_profile(device['eep'])
+                        if profile: entities = profile.get_entities()
+                    except Exception as e:
+                        logger.error(f"Error removing HA entities during delete: {e}")
+                mqtt.remove_device(device_id, entities)
+            return _OK_DELETED
+        return _R400_DELETE_FAILED
 
 async def api_eep_profiles(request):
     loader = service_state.get_eep_loader()
-    return JSONResponse({'profiles': loader.list_profiles() if loader else []})
+    if not loader: return _json_etag_response(request, {'profiles': []})
+    body, etag = _profiles_body.get(loader, lambda: {'profiles': loader.list_profiles()})
+    return _etag_response(request, body, etag)
+
+api_routes = [
+    Route('/status', endpoint=api_status),
+    Route('/system/discovery', endpoint=api_discovery_control, methods=['POST']),
+    Route('/devices', endpoint=api_devices, methods=['GET', 'POST']),
+    Route('/devices/batch', endpoint=api_devices_batch, methods=['POST']),
+    Route('/devices/{device_id}', endpoint=api_device_detail, methods=['GET', 'PUT', 'DELETE']),
+    Route('/eep-profiles', endpoint=api_eep_profiles),
+]
 
 routes = [
     Route('/', endpoint=homepage),
-    Route('/api/status', endpoint=api_status),
-    Route('/api/system/discovery', endpoint=api_discovery_control, methods=['POST']),
-    Route('/api/devices', endpoint=api_devices, methods=['GET', 'POST']),
-    Route('/api/devices/{device_id}', endpoint=api_device_detail, methods=['GET', 'PUT', 'DELETE']),
-    Route('/api/eep-profiles', endpoint=api_eep_profiles),
+    Route('/health', endpoint=health),
+    Mount('/api', routes=api_routes),
 ]
 
+# Explizite Origin-Liste statt '*' (Dashboard selbst ruft die API same-origin auf)
+ALLOWED_ORIGINS = [o.strip() for o in os.getenv('ALLOWED_ORIGINS', 'http://homeassistant.local:8099').split(',') if o.strip()]
+
 middleware = [
-    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+    Middleware(CORSMiddleware, allow_origins=ALLOWED_ORIGINS,
+               allow_methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'], allow_headers=['content-type']),
+    # Profile/device lists are large and repetitive, small responses stay uncompressed
+    Middleware(GZipMiddleware, minimum_size=1024)
 ]
 
-app = Starlette(debug=True, routes=routes, middleware=middleware)
+# Traceback-Seiten nur auf Wunsch (DEBUG=1), im Container standardmäßig aus
+app = Starlette(debug=os.getenv('DEBUG', '0') == '1', routes=routes, middleware=middleware)
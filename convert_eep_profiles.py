@@ -9,19 +9,29 @@ Smart EEP Downloader & Converter v8 (Cover & Climate Support)
 - Markiert RSSI, Last Seen, Error als 'diagnostic'
 - Erkennt Batterien korrekt (device_class: battery)
 """
+import hashlib
 import json
-import os
 import re
+import shutil
+import tempfile
 import urllib.request
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError: # Optional, Fallback auf stdlib json
+    orjson = None
+
 # ==============================================================================
 # KONFIGURATION
 # ==============================================================================
 GITHUB_URL = "https://github.com/Jey-Cee/ioBroker.enocean/archive/refs/heads/master.zip"
 ZIP_INTERNAL_PATH = "ioBroker.enocean-master/lib/definitions/eep"
 DEST_DIR = Path("addon/rootfs/app/eep/definitions")
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+SPOOL_MAX_SIZE = 50 << 20
 
 # ==============================================================================
 # DEFINITIONEN & MAPPINGS
@@ -51,107 +61,147 @@ PREDEFINED_MAPPING = {
     "BTN": {"component": "binary_sensor", "icon": "mdi:gesture-tap-button"}
 }
 
-# Regex für automatische Erkennung
-SEMANTIC_MAPPING = [
+# Diagnose-Objekte, die jedes Profil bekommt (pro Profil kopiert)
+_RSSI_OBJ = {
+    "name": "RSSI", "component": "sensor", "device_class": "signal_strength", 
+    "state_class": "measurement", "entity_category": "diagnostic",
+    "unit": "dBm", "icon": "mdi:wifi", "description": "Signal strength"
+}
+_LAST_SEEN_OBJ = {
+    "name": "Last Seen", "component": "sensor", "device_class": "timestamp", 
+    "entity_category": "diagnostic",
+    "icon": "mdi:clock-outline", "description": "Last telegram received"
+}
+_DIAG_KEYS = frozenset({"rssi", "last_seen"})
+
+# Präfixe für automatische Erkennung (Groß-/Kleinschreibung egal)
+_RAW_SEMANTIC_MAPPING = [
     # WICHTIG: Batterien & Config zuerst
-    (r'(?i)^(bat|battery|charge|storage|level)', sensor_conf("battery", "%", "mdi:battery", category="diagnostic")),
-    (r'(?i)^(interv|cycle|wake|period)', {"component": "number", "entity_category": "config", "icon": "mdi:timer-cog"}),
+    ('bat|battery|charge|storage|level', sensor_conf("battery", "%", "mdi:battery", category="diagnostic")),
+    ('interv|cycle|wake|period', {"component": "number", "entity_category": "config", "icon": "mdi:timer-cog"}),
     
     # Climate Controls (Sollwerte steuerbar machen)
-    (r'(?i)^(setpoint|sollwert|target)', {"component": "number", "device_class": "temperature", "unit": "°C", "icon": "mdi:thermostat"}),
-    (r'(?i)^(valve|ventil|pos)', {"component": "number", "icon": "mdi:pipe-valve", "unit": "%"}), # Ventilöffnung 0-100%
-    (r'(?i)^(fan|speed|stufe|geblaese)', {"component": "number", "icon": "mdi:fan"}),
+    ('setpoint|sollwert|target', {"component": "number", "device_class": "temperature", "unit": "°C", "icon": "mdi:thermostat"}),
+    ('valve|ventil|pos', {"component": "number", "icon": "mdi:pipe-valve", "unit": "%"}), # Ventilöffnung 0-100%
+    ('fan|speed|stufe|geblaese', {"component": "number", "icon": "mdi:fan"}),
 
     # Sensoren
-    (r'(?i)^(tmp|temp|temperature)', sensor_conf("temperature", "°C", "mdi:thermometer")),
-    (r'(?i)^(hum|humidity)', sensor_conf("humidity", "%", "mdi:water-percent")),
-    (r'(?i)^(illu|illumination|brightness)', sensor_conf("illuminance", "lx", "mdi:brightness-6")),
-    (r'(?i)^(volt|voltage)', sensor_conf("voltage", "V", "mdi:lightning-bolt")),
-    (r'(?i)^(curr|current)', sensor_conf("current", "A", "mdi:current-ac")),
-    (r'(?i)^(pwr|power)', sensor_conf("power", "W", "mdi:flash")),
-    (r'(?i)^(energy)', {"component": "sensor", "device_class": "energy", "state_class": "total_increasing", "unit": "kWh", "icon": "mdi:counter"}),
-    (r'(?i)^(co2|carbon)', sensor_conf("carbon_dioxide", "ppm", "mdi:molecule-co2")),
+    ('tmp|temp|temperature', sensor_conf("temperature", "°C", "mdi:thermometer")),
+    ('hum|humidity', sensor_conf("humidity", "%", "mdi:water-percent")),
+    ('illu|illumination|brightness', sensor_conf("illuminance", "lx", "mdi:brightness-6")),
+    ('volt|voltage', sensor_conf("voltage", "V", "mdi:lightning-bolt")),
+    ('curr|current', sensor_conf("current", "A", "mdi:current-ac")),
+    ('pwr|power', sensor_conf("power", "W", "mdi:flash")),
+    ('energy', {"component": "sensor", "device_class": "energy", "state_class": "total_increasing", "unit": "kWh", "icon": "mdi:counter"}),
+    ('co2|carbon', sensor_conf("carbon_dioxide", "ppm", "mdi:molecule-co2")),
     
     # Diagnose
-    (r'(?i)^(rssi|signal)', sensor_conf("signal_strength", "dBm", "mdi:wifi", category="diagnostic")),
-    (r'(?i)^(err|error|fail|failure|alarm|warn)', {"component": "binary_sensor", "device_class": "problem", "entity_category": "diagnostic"}),
+    ('rssi|signal', sensor_conf("signal_strength", "dBm", "mdi:wifi", category="diagnostic")),
+    ('err|error|fail|failure|alarm|warn', {"component": "binary_sensor", "device_class": "problem", "entity_category": "diagnostic"}),
 
     # Binäre Typen
-    (r'(?i)^(contact|window|door|closed|open)', {"component": "binary_sensor", "device_class": "window", "icon": "mdi:window-closed"}),
-    (r'(?i)^(motion|pir|occ|occupancy)', {"component": "binary_sensor", "device_class": "motion", "icon": "mdi:motion-sensor"}),
-    (r'(?i)^(btn|button|sw|switch)', {"component": "binary_sensor", "icon": "mdi:gesture-tap-button"}),
+    ('contact|window|door|closed|open', {"component": "binary_sensor", "device_class": "window", "icon": "mdi:window-closed"}),
+    ('motion|pir|occ|occupancy', {"component": "binary_sensor", "device_class": "motion", "icon": "mdi:motion-sensor"}),
+    ('btn|button|sw|switch', {"component": "binary_sensor", "icon": "mdi:gesture-tap-button"}),
 ]
 
-def apply_family_rules(eep_code, obj_key, obj_data):
-    eep = eep_code.upper()
-    name_lower = obj_key.lower()
+# Präfix-Tabelle statt Regex: kleingeschriebenes Präfix -> Attribute
+SEMANTIC_PREFIXES = {prefix: attrs for alts, attrs in _RAW_SEMANTIC_MAPPING for prefix in alts.split('|')}
+SEMANTIC_PREFIX_LENGTHS = sorted({len(prefix) for prefix in SEMANTIC_PREFIXES})
 
-    if obj_data.get("unit") and obj_data.get("component") != "number": 
-        return # Analoge Sensoren behalten (außer wir haben sie oben schon als 'number' erkannt)
+# Kein Präfix darf Anfang eines Präfixes aus einem anderen Eintrag sein,
+# sonst hinge das Ergebnis von der Reihenfolge ab (pro Key gibt es so max. einen Treffer)
+_ALL_PREFIXES = [(prefix, i) for i, (alts, _) in enumerate(_RAW_SEMANTIC_MAPPING) for prefix in alts.split('|')]
+assert not [(a, b) for a, i in _ALL_PREFIXES for b, j in _ALL_PREFIXES if i != j and b.startswith(a)], \
+    "Semantic prefixes of different entries must not overlap"
+
+def match_semantic(name_lower):
+    """Returns the attributes of the mapping entry whose prefix starts name_lower, or None"""
+    for length in SEMANTIC_PREFIX_LENGTHS:
+        if length > len(name_lower): break
+        attrs = SEMANTIC_PREFIXES.get(name_lower[:length])
+        if attrs is not None: return attrs
+    return None
 
-    # Rollläden / Jalousien (Cover)
-    if eep.startswith("D2-05"):
-        # Position oder Angle -> Cover
-        if any(x in name_lower for x in ['pos', 'angle', 'level']):
-            obj_data["component"] = "cover"
-            obj_data["device_class"] = "shutter" # oder 'blind'
-            return
+# Familien-Regeln: ein Handler pro EEP-Familie (Schlüssel ist der Präfix "XX-YY").
+# Handler bekommen (name_lower, obj_data, has_unit).
+_COVER_RE = re.compile(r'pos|angle|level')
+_ACTOR_RE = re.compile(r'channel|output|switch|relay')
+_SETPOINT_RE = re.compile(r'setpoint|sollwert')
 
+def _handle_d2_05(name_lower, obj_data, has_unit):
+    # Rollläden / Jalousien (Cover): Position oder Angle -> Cover
+    if _COVER_RE.search(name_lower):
+        obj_data["component"] = "cover"
+        obj_data["device_class"] = "shutter" # oder 'blind'
+
+def _handle_f6(name_lower, obj_data, has_unit):
     # Taster
-    if eep.startswith("F6-02") or eep.startswith("F6-01"):
-        obj_data["component"] = "binary_sensor"
-        obj_data["icon"] = "mdi:light-switch"
-        return
-    
+    obj_data["component"] = "binary_sensor"
+    obj_data["icon"] = "mdi:light-switch"
+
+def _handle_d5_00(name_lower, obj_data, has_unit):
     # Fensterkontakte
-    if eep.startswith("D5-00"):
-        obj_data["component"] = "binary_sensor"
-        if "contact" in name_lower: obj_data["device_class"] = "window"
-        return
-    
+    obj_data["component"] = "binary_sensor"
+    if "contact" in name_lower: obj_data["device_class"] = "window"
+
+def _handle_f6_10(name_lower, obj_data, has_unit):
     # Fenstergriffe
-    if eep.startswith("F6-10") and "handle" in name_lower:
+    if "handle" in name_lower:
         obj_data["component"] = "sensor"
         obj_data["icon"] = "mdi:window-open-variant"
-        return
-    
+
+def _handle_d2_01(name_lower, obj_data, has_unit):
     # Aktoren (Light vs Switch)
-    if eep.startswith("D2-01") or eep.startswith("A5-38"):
-        if any(x in name_lower for x in ['channel', 'output', 'switch', 'relay']) and not obj_data.get("unit"):
-             obj_data["component"] = "switch"
-             obj_data["device_class"] = "outlet"
-        elif "dim" in name_lower:
-            obj_data["component"] = "light"
-            obj_data["icon"] = "mdi:lightbulb"
-
-    # Thermostate / Raumcontroller (A5-10, A5-20)
-    # Hier stellen wir sicher, dass Sollwerte 'number' sind
-    if eep.startswith("A5-10") or eep.startswith("A5-20"):
-        if any(x in name_lower for x in ['setpoint', 'sollwert']):
-            obj_data["component"] = "number"
-            obj_data["device_class"] = "temperature"
-            obj_data["icon"] = "mdi:thermostat"
+    if _ACTOR_RE.search(name_lower) and not has_unit:
+         obj_data["component"] = "switch"
+         obj_data["device_class"] = "outlet"
+    elif "dim" in name_lower:
+        obj_data["component"] = "light"
+        obj_data["icon"] = "mdi:lightbulb"
+
+def _handle_a5_thermo(name_lower, obj_data, has_unit):
+    # Thermostate / Raumcontroller: Sollwerte sind 'number'
+    if _SETPOINT_RE.search(name_lower):
+        obj_data["component"] = "number"
+        obj_data["device_class"] = "temperature"
+        obj_data["icon"] = "mdi:thermostat"
+
+def _noop(name_lower, obj_data, has_unit):
+    pass
+
+FAMILY_HANDLERS = {
+    "D2-05": _handle_d2_05,
+    "F6-02": _handle_f6, "F6-01": _handle_f6,
+    "D5-00": _handle_d5_00,
+    "F6-10": _handle_f6_10,
+    "D2-01": _handle_d2_01, "A5-38": _handle_d2_01,
+    "A5-10": _handle_a5_thermo, "A5-20": _handle_a5_thermo,
+}
+
+def apply_family_rules(eep_prefix, name_lower, obj_data):
+    """eep_prefix ist der großgeschriebene Familien-Präfix ("XX-YY"), name_lower der kleingeschriebene Key"""
+    has_unit = bool(obj_data.get("unit")) # Einmal lesen, die Handler bekommen das Ergebnis
+    if has_unit and obj_data.get("component") != "number": 
+        return # Analoge Sensoren behalten (außer wir haben sie oben schon als 'number' erkannt)
+
+    FAMILY_HANDLERS.get(eep_prefix, _noop)(name_lower, obj_data, has_unit)
 
 # ==============================================================================
 # LOGIK (Werte Korrektur)
 # ==============================================================================
 
+BINARY_COMPONENTS = frozenset({"binary_sensor", "switch", "light"})
+
 def enforce_binary_values(profile_data):
     """Zwingt binary_sensor, switch und light dazu, "ON"/"OFF" zurückzugeben."""
-    target_shortcuts = []
-    
-    if "objects" in profile_data:
-        for key, obj in profile_data["objects"].items():
-            # Units (außer %) ignorieren wir meist, aber sicherheitshalber:
-            # Wenn es eine Number ist (Setpoint), darf es NICHT binary sein.
-            if obj.get("component") == "number": continue
-            
-            # Nur binäre Komponenten anfassen
-            if obj.get("component") in ["binary_sensor", "switch", "light"]:
-                # Ausnahme: Dimmer (light) mit Unit % ist analog!
-                if obj.get("component") == "light" and obj.get("unit") == "%":
-                    continue
-                target_shortcuts.append(key)
+    # Nur binäre Komponenten anfassen (eine Number/Setpoint ist nie binary).
+    # Ausnahme: Dimmer (light) mit Unit % ist analog!
+    target_shortcuts = frozenset(
+        key for key, obj in profile_data.get("objects", {}).items()
+        if obj.get("component") in BINARY_COMPONENTS
+        and not (obj.get("component") == "light" and obj.get("unit") == "%")
+    )
     
     if not target_shortcuts or "case" not in profile_data:
         return profile_data
@@ -172,80 +222,114 @@ def enforce_binary_values(profile_data):
     return profile_data
 
 def enhance_profile(profile_data):
-    eep_code = profile_data.get("eep", "UNKNOWN")
-    if "objects" not in profile_data: profile_data["objects"] = {}
+    eep_prefix = profile_data.get("eep", "UNKNOWN")[:5].upper()
+    objs = profile_data.setdefault("objects", {})
 
-    if "preDefined" in profile_data["objects"]:
-        pre_def_list = profile_data["objects"]["preDefined"]
+    if "preDefined" in objs:
+        pre_def_list = objs["preDefined"]
         if isinstance(pre_def_list, list):
             for item in pre_def_list:
-                if item in PREDEFINED_MAPPING:
-                    new_obj = PREDEFINED_MAPPING[item].copy()
-                    new_obj["shortcut"] = item
-                    if item not in profile_data["objects"]:
-                        profile_data["objects"][item] = new_obj
-        del profile_data["objects"]["preDefined"]
-
-    # Diagnostics
-    profile_data["objects"]["rssi"] = {
-        "name": "RSSI", "component": "sensor", "device_class": "signal_strength", 
-        "state_class": "measurement", "entity_category": "diagnostic",
-        "unit": "dBm", "icon": "mdi:wifi", "description": "Signal strength"
-    }
-    profile_data["objects"]["last_seen"] = {
-        "name": "Last Seen", "component": "sensor", "device_class": "timestamp", 
-        "entity_category": "diagnostic",
-        "icon": "mdi:clock-outline", "description": "Last telegram received"
-    }
+                if item in PREDEFINED_MAPPING and item not in objs:
+                    objs[item] = PREDEFINED_MAPPING[item] | {"shortcut": item}
+        del objs["preDefined"]
 
-    for obj_key in list(profile_data["objects"].keys()):
-        obj_data = profile_data["objects"][obj_key]
+    # Die Schleife ändert nur Werte, keine Keys: direkt über items() iterieren
+    for obj_key, obj_data in objs.items():
+        if obj_key in _DIAG_KEYS: continue # werden unten ohnehin ersetzt
         if not isinstance(obj_data, dict): continue
-        if obj_key in ["rssi", "last_seen"]: continue
         
-        # 1. Regex Mapping (hier werden auch Setpoints zu 'number')
-        for pattern, attributes in SEMANTIC_MAPPING:
-            if re.search(pattern, obj_key):
-                for k, v in attributes.items():
-                    if k not in obj_data: obj_data[k] = v
-                break
+        # 1. Präfix Mapping (hier werden auch Setpoints zu 'number')
+        name_lower = obj_key.lower()
+        attributes = match_semantic(name_lower)
+        if attributes:
+            for k, v in attributes.items():
+                if k not in obj_data: obj_data[k] = v
         
         # 2. Familien Regeln (hier werden Blinds zu 'cover')
-        apply_family_rules(eep_code, obj_key, obj_data)
+        apply_family_rules(eep_prefix, name_lower, obj_data)
         
         # 3. Fallback
         if "component" not in obj_data:
             obj_data["component"] = "sensor"
             if obj_data.get("unit") == "%": obj_data["icon"] = "mdi:percent"
 
+    # Diagnostics (erst nach der Schleife, damit die Iteration keine neuen Keys sieht)
+    objs["rssi"] = _RSSI_OBJ.copy()
+    objs["last_seen"] = _LAST_SEEN_OBJ.copy()
+
     profile_data = enforce_binary_values(profile_data)
     return profile_data
 
+def _loads(raw):
+    """Returns (data, strict); strict=False wenn nur stdlib json den Input akzeptiert"""
+    if orjson:
+        try: return orjson.loads(raw), True
+        except orjson.JSONDecodeError: pass # z.B. UTF-8 BOM oder NaN/Infinity: stdlib kann das
+    return json.loads(raw), False
+
+def _dumps(data, strict=True):
+    """Serialisiert mit 2er-Einrückung als UTF-8 Bytes"""
+    # orjson würde NaN/Infinity als null schreiben, solche Profile bleiben bei stdlib json
+    if orjson and strict: return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+def convert_entry(raw):
+    """Worker: dekodiert, erweitert und serialisiert ein Profil -> (bytes, error)"""
+    try: data, strict = _loads(raw)
+    except json.JSONDecodeError: return None, None
+    try: enhanced_data = enhance_profile(data)
+    except Exception as e: return None, str(e)
+    return _dumps(enhanced_data, strict), None
+
 def download_and_process():
     print(f"ℹ️  Nutze relatives Zielverzeichnis: {DEST_DIR}")
     print(f"⬇️  Lade Repository von GitHub...\n    {GITHUB_URL}")
     try:
-        zip_path, _ = urllib.request.urlretrieve(GITHUB_URL)
-        print("📦 Extrahiere und verarbeite Dateien...")
+        # Download in 128 KB Blöcken in einen Spool (bis 50 MB im RAM, danach Temp-Datei).
+        # Entpacken erst danach: das Zip-Inhaltsverzeichnis steht am Ende des Archivs.
         count = 0
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            for file_info in zip_ref.infolist():
-                if file_info.filename.startswith(ZIP_INTERNAL_PATH) and file_info.filename.endswith(".json"):
-                    with zip_ref.open(file_info) as f:
-                        try: data = json.load(f)
-                        except json.JSONDecodeError: continue
-                    try: enhanced_data = enhance_profile(data)
-                    except Exception as e:
-                        print(f"⚠️  Fehler bei {file_info.filename}: {e}"); continue
-                    
-                    rel_path = file_info.filename.replace(ZIP_INTERNAL_PATH + "/", "")
-                    target_file = DEST_DIR / rel_path
-                    target_file.parent.mkdir(parents=True, exist_ok=True)
-                    with open(target_file, 'w', encoding='utf-8') as f:
-                        json.dump(enhanced_data, f, indent=2, ensure_ascii=False)
-                    count += 1
-                    if count % 10 == 0: print(f"   ... {count} Dateien verarbeitet", end="\r")
-        os.remove(zip_path)
+        entries = [] # (filename, content_key) in Archiv-Reihenfolge
+        unique = {} # content_key -> raw: identische Profile nur einmal konvertieren
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            with urllib.request.urlopen(GITHUB_URL) as response:
+                shutil.copyfileobj(response, spool, DOWNLOAD_CHUNK_SIZE)
+            spool.seek(0)
+            print("📦 Extrahiere und verarbeite Dateien...")
+            # ZipFile ist nicht thread-/prozesssicher: Einträge sequentiell lesen, Rechenarbeit im Pool
+            with zipfile.ZipFile(spool, 'r') as zip_ref:
+                for file_info in zip_ref.infolist():
+                    if file_info.filename.startswith(ZIP_INTERNAL_PATH) and file_info.filename.endswith(".json"):
+                        raw = zip_ref.read(file_info) # Ganzer Eintrag in einem Aufruf, ohne ZipExtFile-Handle
+                        key = hashlib.blake2b(raw, digest_size=16).digest()
+                        unique.setdefault(key, raw)
+                        entries.append((file_info.filename, key))
+
+        seen_dirs = set()
+        writes = []
+        # Schreiben im Thread-Pool, damit der Prozess-Pool ohne Warten auf die Platte weiterliefert
+        with ProcessPoolExecutor() as pool, ThreadPoolExecutor(max_workers=4) as io_pool:
+            # Ergebnisse kommen in Reihenfolge des ersten Auftretens: nur so weit abholen wie nötig
+            pending = zip(unique, pool.map(convert_entry, unique.values(), chunksize=16))
+            results = {}
+            for filename, key in entries:
+                while key not in results:
+                    done_key, result = next(pending)
+                    results[done_key] = result
+                data, error = results[key]
+                if error is not None:
+                    print(f"⚠️  Fehler bei {filename}: {error}"); continue
+                if data is None: continue
+
+                rel_path = filename.replace(ZIP_INTERNAL_PATH + "/", "")
+                target_file = DEST_DIR / rel_path
+                parent = target_file.parent
+                if parent not in seen_dirs: # mkdir nur einmal pro Verzeichnis
+                    parent.mkdir(parents=True, exist_ok=True)
+                    seen_dirs.add(parent)
+                writes.append(io_pool.submit(target_file.write_bytes, data)) # Schon serialisiert
+                count += 1
+                if count % 10 == 0: print(f"   ... {count} Dateien verarbeitet", end="\r")
+        for write in writes: write.result() # Schreibfehler hier melden
         print(f"\n🎉 Fertig! {count} Profile konvertiert (v8: Cover, Climate Controls, Fixes).")
     except Exception as e: print(f"\n❌ FEHLER: {e}")
 